@@ -1,92 +1,38 @@
-from flask import Flask, request, jsonify, render_template_string
-from stellar_sdk import Keypair, Server, TransactionBuilder, Asset
-from bip_utils import Bip39SeedGenerator, Bip39MnemonicValidator, Bip39Languages, Bip32Slip10Ed25519
+from flask import Flask, request, jsonify
+from bip_utils import Bip39MnemonicValidator, Bip39Languages
+from decimal import Decimal
+from pi_core import clear_cached_seeds, get_server, derive_pi_keypair, is_valid_address, load_account_and_fee, send_pi
+import signal
 import time
 import os
 
 app = Flask(__name__)
-
-# Pi Network configuration
-NETWORK_PASSPHRASE = "Pi Network"
-API_BASE = "https://api.mainnet.minepi.com"
-RESERVE_AMOUNT = 0.01
-
-def get_server():
-    return Server(API_BASE)
-
-def derive_pi_keypair(mnemonic: str):
-    seed_bytes = Bip39SeedGenerator(mnemonic).Generate()
-    bip32 = Bip32Slip10Ed25519.FromSeed(seed_bytes)
-    key = bip32.DerivePath("m/44'/314159'/0'").PrivateKey().Raw().ToBytes()
-    sender_secret = Keypair.from_raw_ed25519_seed(key).secret
-    sender_keypair = Keypair.from_secret(sender_secret)
-    return sender_keypair.public_key, sender_secret
-
-def send_pi(sender_pub, sender_secret, dest_address, amount, available_balance, sweep=False, max_attempts=50):
-    server = get_server()
-    sender_kp = Keypair.from_secret(sender_secret)
-    attempts = 0
-    last_error = None
-
-    send_amount = max(0, available_balance - RESERVE_AMOUNT) if sweep or amount <= 0 else min(amount, max(0, available_balance - RESERVE_AMOUNT))
-
-    try:
-        account = server.load_account(sender_pub)
-        base_fee = server.fetch_base_fee()
-    except Exception as e:
-        return {"success": False, "error": f"Failed to load account: {str(e)}", "attempts": 0}
-
-    while attempts < max_attempts:
-        attempts += 1
-        print(f"Attempts: {attempts}/50")
-        try:
-            if send_amount <= 0:
-                return {"success": False, "error": "Amount too small or insufficient balance", "attempts": attempts}
-            tx = (
-                TransactionBuilder(
-                    source_account=account,
-                    network_passphrase=NETWORK_PASSPHRASE,
-                    base_fee=base_fee,
-                )
-                .append_payment_op(destination=dest_address, amount=str(send_amount), asset=Asset.native())
-                .set_timeout(30)
-                .build()
-            )
-            tx.sign(sender_kp)
-            result = server.submit_transaction(tx)
-            if "hash" in result:
-                return {"success": True, "txHash": result["hash"], "amount": send_amount, "attempts": attempts}
-            last_error = "Transaction failed"
-        except Exception as e:
-            last_error = str(e)
-            if "429" in str(e):
-                time.sleep(0.1)
-
-    return {"success": False, "error": last_error or "No attempts made", "attempts": attempts}
+app.jinja_env.auto_reload = False
 
 @app.route('/', methods=['GET', 'POST'])
 def index():
     if request.method == 'POST':
         mnemonic = request.form.get('mnemonic', '').strip().lower()
-        destination = request.form.get('destination', '')
+        destination = request.form.get('destination', '').strip()
         amount = float(request.form.get('amount', 0) or 0)
         sweep = request.form.get('sweep', 'off') == 'on'
 
         validator = Bip39MnemonicValidator(Bip39Languages.ENGLISH)
         if not validator.IsValid(mnemonic) or len(mnemonic.split()) != 24:
-            return render_template_string(HTML_TEMPLATE, error="Invalid mnemonic phrase", output="")
+            return _TPL.render(error="Invalid mnemonic phrase", output="")
+        if not is_valid_address(destination):
+            return _TPL.render(error="Invalid destination address", output="")
 
         try:
-            pub_key, secret = derive_pi_keypair(mnemonic)
+            sender_kp, pub_key = derive_pi_keypair(mnemonic)
             server = get_server()
-            account = server.accounts().account_id(pub_key).call()
-            balances = {bal['asset_type']: float(bal['balance']) for bal in account['balances']}
-            available_balance = balances.get("native", 0.0)
+            account, base_fee = load_account_and_fee(server, pub_key)
+            available_balance = next((Decimal(bal['balance']) for bal in account.raw_data['balances'] if bal['asset_type'] == "native"), Decimal(0))
         except Exception as e:
-            return render_template_string(HTML_TEMPLATE, error=f"Failed to load account: {str(e)}", output="")
+            return _TPL.render(error=f"Failed to load account: {str(e)}", output="")
 
         start_time = time.time()
-        result = send_pi(pub_key, secret, destination, amount, available_balance, sweep=sweep)
+        result = send_pi(pub_key, sender_kp, destination, amount, available_balance, sweep=sweep, account=account, base_fee=base_fee)
         end_time = time.time()
 
         output = f"Available Pi balance: {available_balance} PI\n"
@@ -97,9 +43,9 @@ def index():
         else:
             output += f"❌ Failed after {result['attempts']} attempts: {result['error']}"
 
-        return render_template_string(HTML_TEMPLATE, error="", output=output)
+        return _TPL.render(error="", output=output)
 
-    return render_template_string(HTML_TEMPLATE, error="", output="")
+    return _TPL.render(error="", output="")
 
 HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -148,6 +94,12 @@ HTML_TEMPLATE = """
 </html>
 """
 
+# Parsed once at import instead of on every request
+_TPL = app.jinja_env.from_string(HTML_TEMPLATE)
+
 if __name__ == "__main__":
+    # Drop cached seeds on demand: kill -USR1 <pid>
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: clear_cached_seeds())
     port = int(os.getenv("PORT", 8080))
     app.run(host="0.0.0.0", port=port)
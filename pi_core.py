@@ -0,0 +1,352 @@
+from stellar_sdk import Keypair, Server, StrKey, TransactionBuilder, Asset
+from stellar_sdk.client.requests_client import IDENTIFICATION_HEADERS, USER_AGENT, RequestsClient
+from stellar_sdk.client.response import Response
+from stellar_sdk.exceptions import BadRequestError, BadResponseError, NotFoundError
+from stellar_sdk.exceptions import ConnectionError as HorizonConnectionError
+from bip_utils import Bip39SeedGenerator, Bip32Slip10Ed25519
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+import nacl.signing  # noqa: F401 -- stellar-sdk signs through libsodium; fail at import rather than mid-send
+from collections import OrderedDict
+from decimal import Decimal, ROUND_DOWN
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import functools
+import orjson
+import requests
+import threading
+import time
+import os
+
+# Pi Network configuration
+NETWORK_PASSPHRASE = "Pi Network"
+API_BASE = "https://api.mainnet.minepi.com"
+RESERVE_AMOUNT = Decimal("0.01")
+SUBMIT_WORKERS = 16
+# Result codes that mean the cached envelope can never land and must be rebuilt
+REBUILD_TX_CODES = {"tx_bad_seq", "tx_too_late"}
+# Operation failures that no amount of retrying will fix
+PERMANENT_OP_CODES = {"op_no_destination", "op_no_trust", "op_underfunded"}
+MAX_BACKOFF = 1.0
+MAX_RETRY_AFTER = 5 * MAX_BACKOFF
+STROOP = Decimal("0.0000001")
+# SEP-29 account data entry marking destinations that reject memo-less payments ("1", base64)
+MEMO_REQUIRED_KEY = "config.memo_required"
+MEMO_REQUIRED_VALUE = "MQ=="
+BASE_FEE_TTL = 30
+SEED_CACHE_TTL = 300
+SEED_CACHE_SIZE = 16
+
+class TokenBucket:
+    """Process-wide pacing for Horizon calls: ``rate`` tokens per second, bursting up to ``capacity``."""
+
+    def __init__(self, rate, capacity):
+        if rate <= 0:
+            raise ValueError(f"TokenBucket rate must be positive, got {rate}")
+        if capacity < 1:
+            raise ValueError(f"TokenBucket capacity must be at least 1, got {capacity}")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+HORIZON_BUCKET = TokenBucket(
+    rate=float(os.getenv("HORIZON_RATE", 10)),
+    capacity=float(os.getenv("HORIZON_BURST", 20)),
+)
+
+class OrjsonResponse(Response):
+    """Response that keeps Horizon's raw body bytes so orjson can parse them without a str round trip."""
+
+    def __init__(self, status_code, content, headers, url, encoding=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+        self.url = url
+        self._encoding = encoding or "utf-8"
+
+    @property
+    def text(self):
+        return self.content.decode(self._encoding, errors="replace")
+
+    def json(self):
+        return orjson.loads(self.content)
+
+class OrjsonRequestsClient(RequestsClient):
+    """RequestsClient that parses Horizon JSON with orjson instead of the stdlib."""
+
+    def __init__(self, session, **kwargs):
+        super().__init__(session=session, **kwargs)
+        self._raw_session = session
+
+    def get(self, url, params=None):
+        try:
+            resp = self._raw_session.get(url, params=params, timeout=self.request_timeout)
+        except RequestException as err:
+            raise HorizonConnectionError(err)
+        return self._wrap(resp)
+
+    def post(self, url, data=None):
+        try:
+            resp = self._raw_session.post(url, data=data, timeout=self.post_timeout)
+        except RequestException as err:
+            raise HorizonConnectionError(err)
+        return self._wrap(resp)
+
+    @staticmethod
+    def _wrap(resp):
+        return OrjsonResponse(status_code=resp.status_code, content=resp.content, headers=dict(resp.headers), url=resp.url, encoding=resp.encoding)
+
+@functools.lru_cache(maxsize=1)
+def get_server():
+    # One keep-alive session for the whole process so retries skip the TCP/TLS handshake
+    session = requests.Session()
+    # RequestsClient only stamps its client headers on sessions it creates itself
+    session.headers.update({**IDENTIFICATION_HEADERS, "User-Agent": USER_AGENT})
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=32, max_retries=0))
+    return Server(API_BASE, client=OrjsonRequestsClient(session=session))
+
+def _compute_pi_seed(mnemonic: str):
+    seed_bytes = Bip39SeedGenerator(mnemonic).Generate()
+    bip32 = Bip32Slip10Ed25519.FromSeed(seed_bytes)
+    return bip32.DerivePath("m/44'/314159'/0'").PrivateKey().Raw().ToBytes()
+
+# Only the raw seed bytes are cached, never a Keypair, and each entry expires after SEED_CACHE_TTL seconds
+_seed_cache = OrderedDict()
+_seed_cache_lock = threading.Lock()
+
+def _derive_pi_seed(mnemonic: str):
+    with _seed_cache_lock:
+        entry = _seed_cache.get(mnemonic)
+        if entry is not None and time.monotonic() < entry[1]:
+            _seed_cache.move_to_end(mnemonic)
+            return entry[0]
+    seed = _compute_pi_seed(mnemonic)
+    with _seed_cache_lock:
+        now = time.monotonic()
+        for key in [key for key, (_, expires) in _seed_cache.items() if expires <= now]:
+            del _seed_cache[key]
+        _seed_cache[mnemonic] = (seed, now + SEED_CACHE_TTL)
+        while len(_seed_cache) > SEED_CACHE_SIZE:
+            _seed_cache.popitem(last=False)
+    return seed
+
+def clear_cached_seeds():
+    with _seed_cache_lock:
+        _seed_cache.clear()
+
+def derive_pi_keypair(mnemonic: str):
+    sender_keypair = Keypair.from_raw_ed25519_seed(_derive_pi_seed(mnemonic))
+    return sender_keypair, sender_keypair.public_key
+
+def is_valid_address(address):
+    # Muxed (M...) destinations are accepted by append_payment_op, so accept them here too
+    return StrKey.is_valid_ed25519_public_key(address) or StrKey.is_valid_med25519_public_key(address)
+
+def _build_signed_xdr(account, base_fee, sender_kp, dest_address, send_amount):
+    tx = (
+        TransactionBuilder(
+            source_account=account,
+            network_passphrase=NETWORK_PASSPHRASE,
+            base_fee=base_fee,
+        )
+        .append_payment_op(destination=dest_address, amount=send_amount, asset=Asset.native())
+        .set_timeout(30)
+        .build()
+    )
+    tx.sign(sender_kp)
+    return tx.to_xdr(), tx.hash_hex()
+
+def _submit(server, xdr):
+    HORIZON_BUCKET.acquire()
+    # SEP-29 memo check is done once in send_pi; left on, it adds an unpaced GET before every POST
+    return server.submit_transaction(xdr, skip_memo_required_check=True)
+
+def _requires_memo(server, dest_address):
+    # Muxed destinations carry their own ID, so SEP-29 does not apply to them
+    if dest_address.startswith("M"):
+        return False
+    HORIZON_BUCKET.acquire()
+    try:
+        destination = server.accounts().account_id(dest_address).call()
+    except NotFoundError:
+        return False
+    return (destination.get("data") or {}).get(MEMO_REQUIRED_KEY) == MEMO_REQUIRED_VALUE
+
+def _result_codes(error):
+    if not isinstance(error, BadRequestError):
+        return {}
+    return (error.extras or {}).get("result_codes") or {}
+
+def _tx_result_code(error):
+    return _result_codes(error).get("transaction")
+
+def _is_permanent_failure(error):
+    return _tx_result_code(error) == "tx_failed" and bool(PERMANENT_OP_CODES.intersection(_result_codes(error).get("operations") or []))
+
+def _parse_retry_after(headers):
+    value = next((v for k, v in (headers or {}).items() if k.lower() == "retry-after"), None)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _retry_after(error):
+    # Horizon errors keep the raw Response as their first argument; cap the wait so one header can't stall a request
+    response = error.args[0] if error.args else None
+    value = _parse_retry_after(getattr(response, "headers", None))
+    return None if value is None else min(max(value, 0.0), MAX_RETRY_AFTER)
+
+def _backoff(retry):
+    return min(2 ** retry * 0.05, MAX_BACKOFF)
+
+def _find_transaction(server, tx_hash):
+    HORIZON_BUCKET.acquire()
+    try:
+        return server.transactions().transaction(tx_hash).call()
+    except NotFoundError:
+        return None
+
+# Pi's base fee almost never moves, so one Horizon read serves every send for BASE_FEE_TTL seconds
+_base_fee = (None, 0.0)
+_base_fee_lock = threading.Lock()
+
+def _cached_base_fee():
+    value, expires = _base_fee
+    return value if value is not None and time.monotonic() < expires else None
+
+def fetch_base_fee(server):
+    global _base_fee
+    with _base_fee_lock:
+        value = _cached_base_fee()
+        if value is not None:
+            return value
+        value = server.fetch_base_fee()
+        _base_fee = (value, time.monotonic() + BASE_FEE_TTL)
+        return value
+
+# Shared across requests so a cache-miss fee fetch doesn't spin up a thread pool per call
+_FEE_PREFETCH = ThreadPoolExecutor(max_workers=1)
+
+def load_account_and_fee(server, sender_pub):
+    base_fee = _cached_base_fee()
+    if base_fee is not None:
+        return server.load_account(sender_pub), base_fee
+    # Independent Horizon reads; overlap them so the pre-send path costs one round trip
+    fee_future = _FEE_PREFETCH.submit(fetch_base_fee, server)
+    account = server.load_account(sender_pub)
+    return account, fee_future.result()
+
+def send_pi(sender_pub, sender_kp, dest_address, amount, available_balance, sweep=False, max_attempts=50, account=None, base_fee=None):
+    # A bad address fails identically on every attempt; reject it before touching Horizon
+    if not is_valid_address(dest_address):
+        return {"success": False, "error": "Invalid destination address", "attempts": 0}
+
+    server = get_server()
+    attempts = 0
+    dispatched = 0
+    last_error = None
+    retry = 0
+    memo_checked = False
+
+    # Stellar amounts carry 7 decimals; stay in Decimal throughout so binary float never eats a stroop
+    amount = Decimal(str(amount))
+    spendable = max(Decimal(0), Decimal(str(available_balance)) - RESERVE_AMOUNT)
+    send_amount = spendable if sweep or amount <= 0 else min(amount, spendable)
+    send_amount = format(send_amount.quantize(STROOP, rounding=ROUND_DOWN), "f")
+    if Decimal(send_amount) <= 0:
+        return {"success": False, "error": "Amount too small or insufficient balance", "attempts": attempts}
+
+    try:
+        if account is None and base_fee is None:
+            account, base_fee = load_account_and_fee(server, sender_pub)
+        if account is None:
+            account = server.load_account(sender_pub)
+        if base_fee is None:
+            base_fee = fetch_base_fee(server)
+        xdr, tx_hash = _build_signed_xdr(account, base_fee, sender_kp, dest_address, send_amount)
+    except Exception as e:
+        return {"success": False, "error": f"Failed to load account: {str(e)}", "attempts": 0}
+
+    # Every attempt carries the same signed envelope, so fire them in parallel and take the first to land
+    pool = ThreadPoolExecutor(max_workers=SUBMIT_WORKERS)
+    try:
+        while dispatched < max_attempts:
+            if not memo_checked:
+                # A transient failure here is retried like a failed submit, as the SDK's per-submit check was
+                try:
+                    if _requires_memo(server, dest_address):
+                        return {"success": False, "error": "Destination account requires a memo", "attempts": attempts}
+                    memo_checked = True
+                except (BadRequestError, BadResponseError, HorizonConnectionError) as e:
+                    attempts += 1
+                    dispatched += 1
+                    last_error = str(e)
+                    time.sleep(_retry_after(e) or _backoff(retry))
+                    retry += 1
+                    continue
+
+            batch = min(SUBMIT_WORKERS, max_attempts - dispatched)
+            futures = [pool.submit(_submit, server, xdr) for _ in range(batch)]
+            dispatched += batch
+            stale = False
+            delay = 0
+            for future in as_completed(futures):
+                # Only submits that actually came back count as attempts
+                attempts += 1
+                try:
+                    result = future.result()
+                    if "hash" in result:
+                        for pending in futures:
+                            pending.cancel()
+                        return {"success": True, "txHash": result["hash"], "amount": send_amount, "attempts": attempts}
+                    last_error = "Transaction failed"
+                except BadRequestError as e:
+                    last_error = str(e)
+                    if _is_permanent_failure(e):
+                        for pending in futures:
+                            pending.cancel()
+                        return {"success": False, "error": last_error, "attempts": attempts}
+                    if _tx_result_code(e) in REBUILD_TX_CODES:
+                        stale = True
+                    elif e.status == 429:
+                        delay = max(delay, _retry_after(e) or _backoff(retry))
+                except (BadResponseError, HorizonConnectionError) as e:
+                    last_error = str(e)
+                    delay = max(delay, _backoff(retry))
+                except Exception as e:
+                    # Defensive fallback; Horizon errors, rate limits included, are handled above by type
+                    last_error = str(e)
+
+            if delay and dispatched < max_attempts:
+                time.sleep(delay)
+                retry += 1
+
+            if stale:
+                # A sibling submit may have landed without us seeing its response; never pay twice.
+                # Reload first: Horizon ingests ledgers atomically, so once the sequence has moved past
+                # ours the transaction is guaranteed to be visible to the lookup that follows.
+                try:
+                    HORIZON_BUCKET.acquire()
+                    account = server.load_account(sender_pub)
+                    if _find_transaction(server, tx_hash):
+                        return {"success": True, "txHash": tx_hash, "amount": send_amount, "attempts": attempts}
+                    xdr, tx_hash = _build_signed_xdr(account, base_fee, sender_kp, dest_address, send_amount)
+                except Exception as e:
+                    last_error = str(e)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    return {"success": False, "error": last_error or "No attempts made", "attempts": attempts}
@@ -0,0 +1,157 @@
+import json
+import threading
+import time
+
+import pytest
+from stellar_sdk import Account, Keypair
+from stellar_sdk.client.response import Response
+from stellar_sdk.exceptions import BadRequestError, NotFoundError
+
+import pi_core
+
+
+def _horizon_error(cls, status, result_codes=None, headers=None):
+    body = {"status": status, "title": "error", "extras": {"result_codes": result_codes} if result_codes else {}}
+    return cls(Response(status_code=status, text=json.dumps(body), headers=headers or {}, url="https://horizon.test"))
+
+class _Call:
+    def __init__(self, fn):
+        self._fn = fn
+        self._arg = None
+
+    def account_id(self, value):
+        self._arg = value
+        return self
+
+    transaction = account_id
+
+    def call(self):
+        return self._fn(self._arg)
+
+class FakeServer:
+    """Stands in for stellar_sdk.Server; ``outcome(n, xdr)`` decides what the n-th submit returns or raises."""
+
+    def __init__(self, outcome, sequence=100, landed=(), destination_data=None):
+        self.outcome = outcome
+        self.sequence = sequence
+        self.landed = set(landed)
+        self.destination_data = destination_data or {}
+        self.submits = []
+        self.loads = 0
+        self._lock = threading.Lock()
+
+    def submit_transaction(self, xdr, skip_memo_required_check=False):
+        assert skip_memo_required_check
+        with self._lock:
+            self.submits.append(xdr)
+            n = len(self.submits)
+        return self.outcome(n, xdr)
+
+    def load_account(self, account_id):
+        # Each reload sees the sequence moved on, as it would after a competing tx landed
+        self.loads += 1
+        return Account(account_id, self.sequence + self.loads)
+
+    def fetch_base_fee(self):
+        return 100
+
+    def accounts(self):
+        return _Call(lambda account_id: {"data": self.destination_data})
+
+    def transactions(self):
+        def find(tx_hash):
+            if tx_hash in self.landed:
+                return {"hash": tx_hash}
+            raise _horizon_error(NotFoundError, 404)
+        return _Call(find)
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(pi_core.time, "sleep", recorded.append)
+    monkeypatch.setattr(pi_core, "HORIZON_BUCKET", pi_core.TokenBucket(rate=1e9, capacity=1e9))
+    return recorded
+
+def _send(server, monkeypatch, **kwargs):
+    monkeypatch.setattr(pi_core, "get_server", lambda: server)
+    sender = Keypair.random()
+    kwargs.setdefault("available_balance", "10")
+    return pi_core.send_pi(
+        sender.public_key, sender, Keypair.random().public_key, kwargs.pop("amount", 1), kwargs.pop("available_balance"),
+        account=Account(sender.public_key, server.sequence), base_fee=100, **kwargs,
+    )
+
+def test_first_hash_wins(monkeypatch, sleeps):
+    server = FakeServer(lambda n, xdr: {"hash": "abc"})
+    result = _send(server, monkeypatch, amount=0, available_balance="1.0000003", sweep=True)
+    assert result == {"success": True, "txHash": "abc", "amount": "0.9900003", "attempts": 1}
+    assert len(set(server.submits)) == 1
+
+def test_permanent_failure_short_circuits(monkeypatch, sleeps):
+    error = _horizon_error(BadRequestError, 400, {"transaction": "tx_failed", "operations": ["op_underfunded"]})
+    def outcome(n, xdr):
+        raise error
+    server = FakeServer(outcome)
+    result = _send(server, monkeypatch)
+    assert not result["success"]
+    assert result["attempts"] == 1
+    assert len(server.submits) <= pi_core.SUBMIT_WORKERS
+
+@pytest.mark.parametrize("retry_after, expected", [("3", 3.0), ("600", pi_core.MAX_RETRY_AFTER), (None, pi_core._backoff(0))])
+def test_rate_limit_waits_for_retry_after(monkeypatch, sleeps, retry_after, expected):
+    headers = {"Retry-After": retry_after} if retry_after else {}
+    def outcome(n, xdr):
+        if n <= pi_core.SUBMIT_WORKERS:
+            raise _horizon_error(BadRequestError, 429, headers=headers)
+        return {"hash": "abc"}
+    server = FakeServer(outcome)
+    result = _send(server, monkeypatch)
+    assert result["success"]
+    assert sleeps == [expected]
+
+def test_stale_envelope_is_rebuilt(monkeypatch, sleeps):
+    def outcome(n, xdr):
+        if n <= pi_core.SUBMIT_WORKERS:
+            raise _horizon_error(BadRequestError, 400, {"transaction": "tx_bad_seq"})
+        return {"hash": "abc"}
+    server = FakeServer(outcome)
+    result = _send(server, monkeypatch)
+    assert result["success"]
+    assert server.loads == 1
+    assert server.submits[0] != server.submits[-1]
+
+def test_stale_envelope_that_landed_is_not_paid_twice(monkeypatch, sleeps):
+    landed = []
+    def outcome(n, xdr):
+        raise _horizon_error(BadRequestError, 400, {"transaction": "tx_bad_seq"})
+    server = FakeServer(outcome)
+    original_build = pi_core._build_signed_xdr
+    def build(*args):
+        xdr, tx_hash = original_build(*args)
+        server.landed.add(tx_hash)
+        landed.append(tx_hash)
+        return xdr, tx_hash
+    monkeypatch.setattr(pi_core, "_build_signed_xdr", build)
+    result = _send(server, monkeypatch)
+    assert result["success"]
+    assert result["txHash"] == landed[0]
+    assert len(landed) == 1
+    assert len(set(server.submits)) == 1
+
+def test_memo_required_destination_is_rejected(monkeypatch, sleeps):
+    server = FakeServer(lambda n, xdr: {"hash": "abc"}, destination_data={pi_core.MEMO_REQUIRED_KEY: pi_core.MEMO_REQUIRED_VALUE})
+    result = _send(server, monkeypatch)
+    assert not result["success"]
+    assert server.submits == []
+
+def test_token_bucket_paces_after_burst():
+    bucket = pi_core.TokenBucket(rate=50, capacity=1)
+    start = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    assert time.monotonic() - start >= 0.09
+
+@pytest.mark.parametrize("rate, capacity", [(0, 20), (-1, 20), (10, 0.5)])
+def test_token_bucket_rejects_unusable_settings(rate, capacity):
+    with pytest.raises(ValueError):
+        pi_core.TokenBucket(rate=rate, capacity=capacity)